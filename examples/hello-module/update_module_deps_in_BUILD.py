@@ -5,95 +5,479 @@ Scan all .ixx C++20 module files in the project, automatically update module_dep
 
 import os
 import re
+import sys
 import json
+import hashlib
+import argparse
+import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
-def extract_module_info(file_path: Path) -> tuple:
+try:
+    import orjson  # 可选依赖，序列化更快
+except ImportError:
+    orjson = None
+
+# 预编译的正则表达式
+# 一次扫描同时识别 export module 声明、import 语句以及模块正文的开始
+# 声明可以位于行首，也可以紧跟在同一行前一条语句的 ';' 之后
+_MODULE_DECL_RE = re.compile(
+    r'(?:^|(?<=;))[ \t]*(?:'
+    r'export\s+module\s+(?P<mod>[a-zA-Z_][a-zA-Z0-9_.:]*)\s*;'          # export module name;
+    r'|(?:export\s+)?import\s+(?:(?P<imp>[a-zA-Z_][a-zA-Z0-9_.:]*)'      # [export] import name;
+    r'|"(?P<hdr>[^"]+)")\s*;'                                           # import "header.h";
+    r'|(?P<body>export\s*\{|export\s+(?!import\b|module\b)\w|namespace\b)'  # 模块正文
+    r')',
+    re.MULTILINE)
+_TARGET_RE = re.compile(r'(cc_module_library|cc_module_binary)\s*\(\s*name\s*=\s*"([^"]+)"')
+_INTERFACES_RE = re.compile(r'module_interfaces\s*=\s*')
+_GLOB_RE = re.compile(r'glob\(\s*\[([^\]]*)\]')
+_STRING_RE = re.compile(r'"([^"]+)"')
+_GLOB_EXCLUDE_RE = re.compile(r'exclude\s*=\s*\[([^\]]*)\]')
+_FILE_RE = re.compile(r'"([^"]+\.ixx)"')
+_EXISTING_DEPS_RE = re.compile(r'module_dependencies\s*=\s*')
+_PAREN_RE = re.compile(r'[()]')
+_VALUE_START_RE = re.compile(r'[\w.]*[\[({]')  # [...]、{...} 或 glob(...) 等调用
+_BRACKET_RE = re.compile(r'[\[\](){}]')
+
+def extract_module_info(file_path: Path, st: Optional[os.stat_result] = None) -> tuple:
     """
     Extract module information from a .ixx file.
+    st may be passed when the caller already has the file's stat result.
     Returns (module_name, list of imported modules)
     """
+    return _read_module_info(os.path.abspath(file_path), st)
+
+# import 的头文件后缀，不作为模块依赖
+_HEADER_SUFFIXES = ('.h', '.hpp')
+
+# 模块声明和 import 都位于文件开头，先只读取这么多字节
+_HEAD_SIZE = 16 * 1024
+
+def _scan_module_decls(content: str) -> tuple:
+    """
+    Scan content for the module declaration and imports.
+    Returns (module_name, list of imported modules, whether the module body was reached)
+    """
     module_name = None
     imports = []
     
+    for match in _MODULE_DECL_RE.finditer(content):
+        kind = match.lastgroup
+        if kind == 'mod':
+            if module_name is None:
+                module_name = match.group('mod')
+        elif kind == 'body':
+            # import 只能出现在模块正文之前，之后无需继续扫描
+            if module_name is not None:
+                return module_name, imports, True
+        else:
+            imp = match.group(kind)
+            # 包含 std 模块，但过滤头文件
+            if not imp.endswith(_HEADER_SUFFIXES):
+                imports.append(imp)
+    
+    return module_name, imports, False
+
+# 解析结果的磁盘缓存：{绝对路径: {"mtime_ns", "size", "hash", "complete", "module_name", "imports"}}
+_SCAN_CACHE_VERSION = 1
+_scan_cache = {}
+_scan_cache_used = set()
+
+def load_scan_cache(cache_file: Path):
+    """
+    Load the per-file parse cache written by a previous run.
+    """
+    _scan_cache.clear()
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        # 匹配 export module 声明
-        module_pattern = r'export\s+module\s+([a-zA-Z_][a-zA-Z0-9_.:]*)\s*;'
-        module_match = re.search(module_pattern, content)
-        if module_match:
-            module_name = module_match.group(1)
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") == _SCAN_CACHE_VERSION:
+            _scan_cache.update(data.get("files", {}))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Error reading cache {cache_file}: {e}")
+
+def save_scan_cache(cache_file: Path):
+    """
+    Atomically write the entries used in this run back to the cache file.
+    """
+    files = {path: _scan_cache[path] for path in sorted(_scan_cache_used) if path in _scan_cache}
+    tmp_file = cache_file.with_name(cache_file.name + '.tmp')
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": _SCAN_CACHE_VERSION, "files": files}, f)
+        os.replace(tmp_file, cache_file)
+    except Exception as e:
+        print(f"Error writing cache {cache_file}: {e}")
+
+def _git_toplevel(path: str) -> Optional[str]:
+    """
+    Return the top-level directory of the git work tree containing path, or None.
+    """
+    try:
+        result = subprocess.run(['git', '-C', path, 'rev-parse', '--show-toplevel'],
+                                capture_output=True, text=True)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() or None
+
+def read_changed_files(list_file: str, project_root: str) -> Set[str]:
+    """
+    Read newline-delimited paths of changed files ('-' reads stdin).
+    Relative paths may be relative to the current directory, the git top-level
+    (as printed by 'git diff --name-only') or the project root.
+    Returns the absolute paths, as used by the scan, of the .ixx files inside the project.
+    """
+    if list_file == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(list_file, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    
+    project_abs = os.path.abspath(project_root)
+    project_real = os.path.realpath(project_root)
+    bases = [os.getcwd(), _git_toplevel(project_abs), project_abs]
+    bases = [base for base in dict.fromkeys(bases) if base]
+    
+    changed = set()
+    for line in lines:
+        path = line.strip()
+        if not path.endswith('.ixx'):
+            continue
+        
+        # 依次尝试各个基准目录，优先选择存在的文件（已删除的文件取第一个落在项目内的路径）
+        candidates = []
+        for base in ([None] if os.path.isabs(path) else bases):
+            full_path = path if base is None else os.path.join(base, path)
+            # 只解析所在目录：符号链接的 .ixx 文件按链接自身的路径记录，与扫描时的缓存键一致
+            real_path = os.path.join(os.path.realpath(os.path.dirname(full_path)),
+                                     os.path.basename(full_path))
+            rel_path = os.path.relpath(real_path, project_real)
+            if rel_path != os.pardir and not rel_path.startswith(os.pardir + os.sep):
+                candidates.append((full_path, os.path.join(project_abs, rel_path)))
         
-        # 匹配各种 import 语句
-        import_patterns = [
-            r'import\s+([a-zA-Z_][a-zA-Z0-9_.:]*)\s*;',      # import module_name;
-            r'export\s+import\s+([a-zA-Z_][a-zA-Z0-9_.:]*)\s*;',  # export import std;
-            r'import\s+"([^"]+)"\s*;',                       # import "header.h";
-        ]
+        if not candidates:
+            print(f"警告: {path} 不在项目目录 {project_abs} 内，已忽略")
+            continue
+        existing = [key for full_path, key in candidates if os.path.isfile(full_path)]
+        changed.add(existing[0] if existing else candidates[0][1])
+    
+    return changed
+
+def _cached_module_info(file_path: str) -> Optional[tuple]:
+    """
+    Return (module_name, imports) from the cache without touching the file, or None.
+    """
+    entry = _scan_cache.get(file_path)
+    if entry is None:
+        return None
+    _scan_cache_used.add(file_path)
+    return entry["module_name"], list(entry["imports"])
+
+def _hash_bytes(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def _read_module_info(file_path: str, st: Optional[os.stat_result] = None) -> tuple:
+    module_name = None
+    imports = []
+    
+    try:
+        _scan_cache_used.add(file_path)
+        if st is None:
+            st = os.stat(file_path)
+        entry = _scan_cache.get(file_path)
+        
+        # mtime 和大小都没变，直接复用上次的结果
+        if entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+            return entry["module_name"], list(entry["imports"])
+        
+        # 二进制模式读取，避免文本模式的换行转换；用 utf-8-sig 解码以去掉 Visual Studio 写入的 BOM
+        with open(file_path, 'rb') as f:
+            head = f.read(_HEAD_SIZE)
+            head_hash = _hash_bytes(head)
+            
+            # 只有 mtime 变化而开头内容相同（例如 touch、切换分支），刷新 mtime 后复用
+            if entry and entry["complete"] and entry["hash"] == head_hash:
+                entry.update(mtime_ns=st.st_mtime_ns, size=st.st_size)
+                return entry["module_name"], list(entry["imports"])
+            
+            module_name, imports, complete = _scan_module_decls(
+                head.decode('utf-8-sig', errors='replace'))
+            
+            # 开头部分没有扫描到模块正文时，读取剩余内容后重新扫描
+            if not complete:
+                rest = f.read()
+                if rest:
+                    module_name, imports, _ = _scan_module_decls(
+                        (head + rest).decode('utf-8-sig', errors='replace'))
+                else:
+                    complete = True  # 整个文件都在开头部分内
         
-        for pattern in import_patterns:
-            import_matches = re.findall(pattern, content)
-            for match in import_matches:
-                # 包含 std 模块，但过滤头文件
-                if not match.endswith('.h') and not match.endswith('.hpp'):
-                    imports.append(match)
+        _scan_cache[file_path] = {
+            "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size,
+            "hash": head_hash,
+            "complete": complete,
+            "module_name": module_name,
+            "imports": imports,
+        }
                     
     except Exception as e:
         print(f"Error reading {file_path}: {e}")
         
     return module_name, imports
 
-def scan_project_modules(project_root: str) -> Dict[str, List[str]]:
+def _find_matching_paren(content: str, start: int) -> int:
+    """
+    Find the ')' closing a call whose '(' was opened before start.
+    Returns the position just after it, or -1 if it is not closed.
+    """
+    paren_count = 0
+    for match in _PAREN_RE.finditer(content, start):
+        if match.group() == '(':
+            paren_count += 1
+        elif paren_count == 0:
+            return match.end()
+        else:
+            paren_count -= 1
+    return -1
+
+def _find_value_end(content: str, start: int) -> int:
+    """
+    Find the end of the bracketed value (list, dict or call such as glob(...)) at start.
+    Returns the position just after its closing bracket, or -1 if there is none.
+    """
+    value_match = _VALUE_START_RE.match(content, start)
+    if not value_match:
+        return -1
+    
+    depth = 1
+    for match in _BRACKET_RE.finditer(content, value_match.end()):
+        if match.group() in '[({':
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return match.end()
+    return -1
+
+def _find_targets(content: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Find every cc_module_library / cc_module_binary target in one pass.
+    Returns {target_name: (start, end)}; the first definition of a name wins.
+    """
+    targets = {}
+    for match in _TARGET_RE.finditer(content):
+        target_name = match.group(2)
+        if target_name in targets:
+            continue
+        # Find the end position of this target (match parentheses)
+        end_pos = _find_matching_paren(content, match.end())
+        if end_pos != -1:
+            targets[target_name] = (match.start(), end_pos)
+    return targets
+
+# 遍历时跳过的目录（版本控制、Bazel 输出目录等）
+_SKIP_DIRS = {'.git', '.svn', '.hg'}
+
+# 最短的模块声明 "export module a;" 的长度
+_MIN_MODULE_FILE_SIZE = len('export module a;')
+
+def _iter_ixx(root: str):
+    """
+    Walk root with os.scandir and yield (path, stat result) for every .ixx file.
+    Symlinked files are included; symlinked directories are not followed.
+    """
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            it = os.scandir(current)
+        except OSError as e:
+            print(f"Error scanning {current}: {e}")
+            continue
+        
+        with it:
+            for entry in it:
+                # 单个条目出错（例如循环符号链接）只跳过该条目，不影响同目录的其他文件
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    is_ixx = not is_dir and entry.name.endswith('.ixx') and entry.is_file()
+                except OSError as e:
+                    print(f"Error scanning {entry.path}: {e}")
+                    continue
+                
+                if is_dir:
+                    if entry.name in _SKIP_DIRS or entry.name.startswith('bazel-'):
+                        continue
+                    stack.append(entry.path)
+                elif is_ixx:
+                    # 太小的文件不可能包含 export module 声明，不必打开
+                    # stat 结果交给解析阶段复用，避免再 stat 一次。Windows 上 DirEntry.stat()
+                    # 直接使用目录读取时缓存的信息；Linux 上跟随链接仍需一次 stat 系统调用
+                    try:
+                        st = entry.stat()
+                    except OSError as e:
+                        print(f"Error scanning {entry.path}: {e}")
+                        continue
+                    if st.st_size >= _MIN_MODULE_FILE_SIZE:
+                        yield entry.path, st
+
+def _clean_imports(module_name: str, imports, partitions=()) -> List[str]:
+    """
+    Drop empty, duplicate and self imports, add the given partition modules and sort.
+    """
+    clean = {imp for imp in imports if imp and imp != module_name}
+    clean.update(partitions)
+    return sorted(clean)
+
+def scan_project_modules(project_root: str, changed_files: Optional[Set[str]] = None
+                         ) -> Tuple[Dict[str, List[str]], Dict[str, Tuple[str, List[str]]]]:
     """
     扫描项目目录，找到所有 .ixx 文件并分析依赖关系
+    When changed_files is given and a cache exists, only those files are re-parsed
+    and every other file is taken from the cache without being read.
+    Returns (module_deps, {absolute file path: (module_name, sorted dependencies)})
     """
     project_path = Path(project_root)
     module_deps = {}
-    all_modules = {}  # 存储所有模块信息：{模块名: 文件路径}
+    parsed_by_path = {}
+    all_modules = set()  # 所有模块名
+    parsed = {}  # {文件路径: (模块名, 导入列表)}
+    ixx_stats = {}  # {文件路径: 遍历目录时得到的 stat 结果}
     
-    # Find all .ixx files
-    ixx_files = list(project_path.rglob("*.ixx"))
+    if changed_files is not None and _scan_cache:
+        # 增量模式：文件列表来自缓存，加上新增的文件，去掉已删除的文件
+        root_prefix = os.path.join(os.path.abspath(project_path), '')
+        changed = {path for path in changed_files if path.startswith(root_prefix)}
+        cached = {path for path in _scan_cache if path.startswith(root_prefix)}
+        ixx_files = sorted(path for path in cached | changed
+                           if path not in changed or os.path.isfile(path))
+        to_parse = [path for path in ixx_files if path in changed]
+        
+        for path in ixx_files:
+            if path not in changed:
+                parsed[path] = _cached_module_info(path)
+        
+        # 列出的文件强制重新解析
+        for path in to_parse:
+            _scan_cache.pop(path, None)
+        
+        print(f"增量模式: {len(ixx_files)} 个 .ixx 文件，其中 {len(to_parse)} 个需要重新解析")
+    else:
+        if changed_files is not None:
+            print("没有可用的缓存，执行完整扫描")
+        
+        # Find all .ixx files
+        ixx_stats = dict(_iter_ixx(str(project_path)))
+        ixx_files = list(ixx_stats)
+        to_parse = ixx_files
+        
+        print(f"找到 {len(ixx_files)} 个 .ixx 文件")
     
-    print(f"找到 {len(ixx_files)} 个 .ixx 文件")
+    # Parse every file once
+    # 解析以 I/O 为主，用线程池并发读取文件
+    if to_parse:
+        with ThreadPoolExecutor(max_workers=(os.cpu_count() or 1) * 4) as pool:
+            parsed.update(zip(to_parse, pool.map(
+                lambda path: extract_module_info(path, ixx_stats.get(path)), to_parse)))
     
     # First pass: collect all module names
     for file_path in ixx_files:
-        rel_path = file_path.relative_to(project_path)
-        module_name, imports = extract_module_info(file_path)
+        module_name, imports = parsed[file_path]
         
         if module_name:
-            all_modules[module_name] = str(rel_path)
+            all_modules.add(module_name)
+    
+    # Index partitions by main module: {主模块名: [分区模块名]}
+    partitions_of = defaultdict(list)
+    for name in sorted(all_modules):
+        main_name, sep, _ = name.partition(':')
+        if sep:
+            partitions_of[main_name].append(name)
     
     # Second pass: analyze dependencies and handle main modules
     for file_path in ixx_files:
-        rel_path = file_path.relative_to(project_path)
-        module_name, imports = extract_module_info(file_path)
+        module_name, imports = parsed[file_path]
         
         if module_name:
-            # Clean and format imports
-            clean_imports = []
-            for imp in imports:
-                # 移除重复和无效的导入
-                if imp and imp not in clean_imports and imp != module_name:
-                    clean_imports.append(imp)
-            
             # If this is a main module (e.g. utils), add all partition modules as dependencies
-            if ':' not in module_name:  # Main module does not have ':'
-                # Find all partition modules belonging to this main module
-                partitions = [mod for mod in all_modules.keys() 
-                            if mod.startswith(f"{module_name}:")]
-                if partitions:
-                    clean_imports.extend(partitions)
-            
+            # (分区模块名带 ':'，不会出现在 partitions_of 的键中)
+            clean_imports = _clean_imports(module_name, imports, partitions_of.get(module_name, ()))
+            parsed_by_path[os.path.abspath(file_path)] = (module_name, clean_imports)
             if clean_imports:
-                # Remove duplicates and sort
-                clean_imports = sorted(list(set(clean_imports)))
                 module_deps[module_name] = clean_imports
     
-    return module_deps
+    return module_deps, parsed_by_path
+
+def _expand_glob_pattern(glob_expr: str, project_root: Path) -> Optional[List[str]]:
+    """
+    Expand one glob include pattern ("dir/*.ixx" or a plain file path).
+    Returns None for patterns that cannot be expanded here (e.g. "**").
+    """
+    # Handle glob pattern
+    if glob_expr.endswith('*.ixx'):
+        # Remove *.ixx to get directory
+        dir_path = glob_expr[:-5]  # 移除 *.ixx
+        if dir_path.endswith('/'):
+            dir_path = dir_path[:-1]
+        if any(c in dir_path for c in '*?['):
+            return None
+        
+        interface_files = []
+        full_dir_path = project_root / dir_path
+        if os.path.isdir(full_dir_path):
+            # Find all matching .ixx files
+            rel_dir = os.path.relpath(full_dir_path, project_root)
+            rel_prefix = '' if rel_dir == os.curdir else rel_dir + os.sep
+            with os.scandir(full_dir_path) as it:
+                for entry in it:
+                    if entry.name.endswith('.ixx') and entry.is_file():
+                        interface_files.append(rel_prefix + entry.name)
+        return interface_files
+    
+    if any(c in glob_expr for c in '*?['):
+        return None
+    
+    # Direct file path
+    return [glob_expr]
+
+def _parse_interfaces(interfaces_str: str, project_root: Path) -> List[str]:
+    """
+    Resolve a module_interfaces value (a list or a glob(...) call) to interface files.
+    """
+    interface_files = []
+    
+    # Handle glob expression
+    if 'glob(' in interfaces_str:
+        # Match the include list inside glob expression
+        glob_match = _GLOB_RE.search(interfaces_str)
+        if glob_match:
+            # 每个 include 模式都要展开；只要有一个无法展开就放弃整个 glob，避免生成不完整的依赖
+            for glob_expr in _STRING_RE.findall(glob_match.group(1)):
+                expanded = _expand_glob_pattern(glob_expr, project_root)
+                if expanded is None:
+                    return []
+                interface_files.extend(expanded)
+            interface_files = list(dict.fromkeys(interface_files))
+            
+            # 去掉 exclude 中列出的文件
+            exclude_match = _GLOB_EXCLUDE_RE.search(interfaces_str)
+            if exclude_match:
+                excluded = set(_FILE_RE.findall(exclude_match.group(1)))
+                interface_files = [f for f in interface_files
+                                   if f.replace(os.sep, '/') not in excluded]
+    else:
+        # Handle directly listed files
+        interface_files = _FILE_RE.findall(interfaces_str)
+    
+    return interface_files
 
 def parse_build_targets(build_file_path: Path) -> Dict[str, List[str]]:
     """
@@ -106,82 +490,31 @@ def parse_build_targets(build_file_path: Path) -> Dict[str, List[str]]:
         with open(build_file_path, 'r', encoding='utf-8') as f:
             content = f.read()
         
-        # Use a more robust method to match complete cc_module_library and cc_module_binary blocks
-        # Find all target start positions and names
-        target_pattern = r'(cc_module_library|cc_module_binary)\s*\(\s*name\s*=\s*"([^"]+)"'
-        targets = []
+        project_root = build_file_path.parent
         
-        for match in re.finditer(target_pattern, content):
-            target_type = match.group(1)  # cc_module_library or cc_module_binary
-            target_name = match.group(2)
-            start_pos = match.start()
-            
-            # Find the end position of this target (match parentheses)
-            paren_count = 0
-            i = match.end()
-            while i < len(content):
-                if content[i] == '(':
-                    paren_count += 1
-                elif content[i] == ')':
-                    if paren_count == 0:
-                        end_pos = i + 1
-                        break
-                    paren_count -= 1
-                i += 1
-            else:
-                continue  # 没有找到匹配的结束括号
+        # Target spans come from _find_targets; module_interfaces is only searched inside each span
+        for target_name, (start_pos, end_pos) in _find_targets(content).items():
+            interfaces_match = _INTERFACES_RE.search(content, start_pos, end_pos)
+            if not interfaces_match:
+                continue
             
-            target_content = content[start_pos:end_pos]
-            targets.append((target_name, target_content))
-        
-        # Parse module_interfaces for each target
-        for target_name, target_content in targets:
-            # Find module_interfaces
-            interfaces_pattern = r'module_interfaces\s*=\s*(\[[^\]]*\]|glob\([^)]*\))'
-            interfaces_match = re.search(interfaces_pattern, target_content, re.DOTALL)
+            value_end = _find_value_end(content, interfaces_match.end())
+            if value_end == -1 or value_end > end_pos:
+                continue
             
-            if interfaces_match:
-                interfaces_str = interfaces_match.group(1)
-                interface_files = []
-                
-                # Handle glob expression
-                if 'glob(' in interfaces_str:
-                    # Match pattern inside glob expression
-                    glob_pattern = r'glob\(\s*\[\s*"([^"]+)"\s*\]\s*\)'
-                    glob_match = re.search(glob_pattern, interfaces_str)
-                    if glob_match:
-                        glob_expr = glob_match.group(1)
-                        project_root = build_file_path.parent
-                        
-                        # Handle glob pattern
-                        if glob_expr.endswith('*.ixx'):
-                            # Remove *.ixx to get directory
-                            dir_path = glob_expr[:-5]  # 移除 *.ixx
-                            if dir_path.endswith('/'):
-                                dir_path = dir_path[:-1]
-                            
-                            full_dir_path = project_root / dir_path
-                            if full_dir_path.exists():
-                                # Find all matching .ixx files
-                                for ixx_file in full_dir_path.glob('*.ixx'):
-                                    rel_path = ixx_file.relative_to(project_root)
-                                    interface_files.append(str(rel_path))
-                        else:
-                            # Direct file path
-                            interface_files.append(glob_expr)
-                else:
-                    # Handle directly listed files
-                    file_pattern = r'"([^"]+\.ixx)"'
-                    interface_files = re.findall(file_pattern, interfaces_str)
-                
-                if interface_files:
-                    target_interfaces[target_name] = interface_files
+            interface_files = _parse_interfaces(content[interfaces_match.end():value_end], project_root)
+            if interface_files:
+                target_interfaces[target_name] = interface_files
                     
     except Exception as e:
         print(f"Error parsing BUILD file {build_file_path}: {e}")
     
     return target_interfaces
 
+# module_dependencies 的输出模板
+_DEPS_LINE_FORMAT = '        "%s": [%s],'
+_DEPS_BLOCK_FORMAT = 'module_dependencies = {\n%s\n    },'
+
 def update_build_file(build_file_path: Path, target_dependencies: Dict[str, Dict[str, List[str]]]):
     """
     Update module_dependencies in the BUILD file
@@ -192,82 +525,65 @@ def update_build_file(build_file_path: Path, target_dependencies: Dict[str, Dict
         
         original_content = content
         updated_targets = []
+        edits = []  # (起始位置, 结束位置, 替换内容)
+        
+        # First pass: locate all targets once
+        targets = _find_targets(content)
         
         for target_name, deps in target_dependencies.items():
             if not deps:  # 如果没有依赖，跳过
                 continue
                 
             # Format dependency dictionary
-            deps_lines = []
-            for module_name, module_deps in sorted(deps.items()):
-                deps_str = ', '.join(f'"{dep}"' for dep in sorted(module_deps))
-                deps_lines.append(f'        "{module_name}": [{deps_str}],')
-            
-            deps_content = '\n'.join(deps_lines)
-            new_module_deps = f'module_dependencies = {{\n{deps_content}\n    }},'
+            deps_content = '\n'.join([
+                _DEPS_LINE_FORMAT % (module_name,
+                                     '"%s"' % '", "'.join(sorted(module_deps)) if module_deps else '')
+                for module_name, module_deps in sorted(deps.items())])
+            new_module_deps = _DEPS_BLOCK_FORMAT % deps_content
             
-            # Use a more accurate method to match and replace the target
-            # First, find the start position of the target
-            target_pattern = rf'(cc_module_library|cc_module_binary)\s*\(\s*name\s*=\s*"{re.escape(target_name)}"'
-            target_match = re.search(target_pattern, content)
+            # Look up the span of this target found in the first pass
+            target_span = targets.get(target_name)
             
-            if target_match:
-                # Find the complete content of this target
-                start_pos = target_match.start()
-                paren_count = 0
-                i = target_match.end()
-                while i < len(content):
-                    if content[i] == '(':
-                        paren_count += 1
-                    elif content[i] == ')':
-                        if paren_count == 0:
-                            end_pos = i + 1
-                            break
-                        paren_count -= 1
-                    i += 1
-                else:
-                    continue
-                
+            if target_span:
+                start_pos, end_pos = target_span
                 target_content = content[start_pos:end_pos]
                 
                 # Check if module_dependencies already exists
-                existing_deps_pattern = r'module_dependencies\s*=\s*\{[^}]*\},'
-                existing_match = re.search(existing_deps_pattern, target_content, re.DOTALL)
-                
+                existing_match = _EXISTING_DEPS_RE.search(target_content)
+                deps_end = -1
                 if existing_match:
-                    # Replace existing module_dependencies
-                    old_deps = existing_match.group(0)
-                    new_target_content = target_content.replace(old_deps, new_module_deps)
-                    content = content.replace(target_content, new_target_content)
+                    deps_end = _find_value_end(target_content, existing_match.end())
+                
+                if deps_end != -1:
+                    # Replace existing module_dependencies (including the trailing comma)
+                    if target_content.startswith(',', deps_end):
+                        deps_end += 1
+                    edits.append((start_pos + existing_match.start(), start_pos + deps_end,
+                                  new_module_deps))
                     updated_targets.append(f"  已更新 {target_name} 的 module_dependencies")
                 else:
                     # Add new module_dependencies
                     # Insert after module_interfaces (find the complete module_interfaces line)
-                    interfaces_start = target_content.find('module_interfaces')
-                    if interfaces_start != -1:
-                        # Find the end of the module_interfaces assignment
-                        equals_pos = target_content.find('=', interfaces_start)
-                        if equals_pos != -1:
-                            # Look for the matching closing bracket/parenthesis and then comma
-                            pos = equals_pos + 1
-                            depth = 0
-                            while pos < len(target_content):
-                                char = target_content[pos]
-                                if char in '[(':
-                                    depth += 1
-                                elif char in '])':
-                                    depth -= 1
-                                elif char == ',' and depth == 0:
-                                    # Found the end of module_interfaces
-                                    interfaces_line = target_content[interfaces_start:pos+1]
-                                    new_target_content = target_content.replace(
-                                        interfaces_line, 
-                                        f'{interfaces_line}\n    {new_module_deps}'
-                                    )
-                                    content = content.replace(target_content, new_target_content)
-                                    updated_targets.append(f"  已添加 {target_name} 的 module_dependencies")
-                                    break
-                                pos += 1
+                    interfaces_match = _INTERFACES_RE.search(target_content)
+                    if interfaces_match:
+                        # Find the end of the module_interfaces value and then the comma
+                        value_end = _find_value_end(target_content, interfaces_match.end())
+                        comma_pos = target_content.find(',', value_end) if value_end != -1 else -1
+                        if comma_pos != -1 and not target_content[value_end:comma_pos].strip():
+                            insert_pos = start_pos + comma_pos + 1
+                            edits.append((insert_pos, insert_pos, f'\n    {new_module_deps}'))
+                            updated_targets.append(f"  已添加 {target_name} 的 module_dependencies")
+        
+        # Apply all edits in a single left-to-right pass
+        if edits:
+            pieces = []
+            last_end = 0
+            for start, end, replacement in sorted(edits, key=lambda edit: edit[0]):
+                pieces.append(content[last_end:start])
+                pieces.append(replacement)
+                last_end = end
+            pieces.append(content[last_end:])
+            content = ''.join(pieces)
         
         # Only write to file if content has changed
         if content != original_content:
@@ -282,11 +598,50 @@ def update_build_file(build_file_path: Path, target_dependencies: Dict[str, Dict
     except Exception as e:
         print(f"Error updating BUILD file {build_file_path}: {e}")
 
+def write_json(json_file: Path, data, pretty: bool = False):
+    """
+    Write data as JSON, compact unless pretty is set. Uses orjson when available.
+    """
+    if orjson is not None:
+        with open(json_file, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 if pretty else 0))
+    else:
+        with open(json_file, 'w', encoding='utf-8') as f:
+            if pretty:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            else:
+                json.dump(data, f, separators=(',', ':'), ensure_ascii=False)
+
+def _buffer_stdout():
+    """
+    Turn off per-line flushing of sys.stdout so progress output is written in chunks.
+    The original stream is kept, so the Windows console still receives Unicode text.
+    """
+    try:
+        sys.stdout.reconfigure(line_buffering=False, write_through=False)
+    except (AttributeError, ValueError):
+        pass  # stdout 已被替换为不支持 reconfigure 的对象（例如 IDE），保持原样
+
 def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--debug', action='store_true',
+                        help='write module_dependencies.json with indentation')
+    parser.add_argument('--changed', metavar='FILE',
+                        help='only re-parse the files listed in FILE (one path per line, '
+                             '"-" for stdin) and take all others from the cache')
+    args = parser.parse_args()
+    
+    # 每条 print 不再单独刷新终端，结束时统一输出
+    _buffer_stdout()
+    
     # Project root directory (same as script location)
     script_dir = Path(__file__).parent
     project_root = script_dir
     build_file_path = project_root / "src" / "BUILD"
+    cache_file = script_dir / ".module_deps_cache.json"
+    
+    load_scan_cache(cache_file)
+    changed_files = read_changed_files(args.changed, str(project_root)) if args.changed else None
     
     print(f"扫描项目目录: {project_root}")
     print(f"BUILD 文件路径: {build_file_path}")
@@ -304,13 +659,14 @@ def main():
     
     # Scan module dependencies
     print("2. 分析模块依赖关系...")
-    all_module_deps = scan_project_modules(str(project_root))
+    all_module_deps, parsed_by_path = scan_project_modules(str(project_root), changed_files)
     
     # For each target, calculate its required module_dependencies
     print("\n" + "=" * 60)
     print("3. 计算每个 target 的 module_dependencies...")
     
     target_dependencies = {}
+    src_dir = os.path.abspath(project_root / "src")
     
     for target_name, interface_files in target_interfaces.items():
         target_deps = {}
@@ -319,29 +675,26 @@ def main():
         
         # Collect dependencies for all modules in this target
         for interface_file in interface_files:
-            file_path = project_root / "src" / interface_file
+            file_path = os.path.normpath(os.path.join(src_dir, interface_file))
             
-            if file_path.exists():
+            # 优先使用扫描阶段的结果（已扫描的文件必然存在，无需 stat），只有项目外的文件才重新解析
+            parsed = parsed_by_path.get(file_path)
+            if parsed is None and os.path.isfile(file_path):
                 module_name, imports = extract_module_info(file_path)
-                
                 if module_name:
-                    # Clean and format imports
-                    clean_imports = []
-                    for imp in imports:
-                        # 移除重复和无效的导入
-                        if imp and imp not in clean_imports and imp != module_name:
-                            clean_imports.append(imp)
-                    
                     # If this is a main module (e.g. utils), add all partition modules as dependencies
-                    if ':' not in module_name and module_name in all_module_deps:
-                        clean_imports = all_module_deps[module_name]
-                    elif clean_imports:
-                        # Remove duplicates and sort
-                        clean_imports = sorted(list(set(clean_imports)))
-                    
-                    if clean_imports:
-                        target_deps[module_name] = clean_imports
-                        print(f"    Add dependency: {module_name} -> {clean_imports}")
+                    partitions = ()
+                    if ':' not in module_name:
+                        prefix = module_name + ':'
+                        partitions = {name for name, _ in parsed_by_path.values()
+                                      if name.startswith(prefix)}
+                    parsed = (module_name, _clean_imports(module_name, imports, partitions))
+            
+            if parsed is not None:
+                module_name, clean_imports = parsed
+                if clean_imports:
+                    target_deps[module_name] = clean_imports
+                    print(f"    Add dependency: {module_name} -> {clean_imports}")
         
         if target_deps:
             target_dependencies[target_name] = target_deps
@@ -356,9 +709,9 @@ def main():
     
     # Update BUILD file
     update_build_file(build_file_path, target_dependencies)
+    save_scan_cache(cache_file)
     
     # Save debug info to file
-    output_file = script_dir / "module_dependencies.txt"
     json_file = script_dir / "module_dependencies.json"
     
     # Generate complete dependency info for debugging
@@ -367,12 +720,11 @@ def main():
         "all_module_deps": all_module_deps,
         "target_dependencies": target_dependencies
     }
-    
-    with open(json_file, 'w', encoding='utf-8') as f:
-        json.dump(debug_info, f, indent=2, ensure_ascii=False)
+    write_json(json_file, debug_info, pretty=args.debug)
     
     print(f"\n调试信息已保存到: {json_file}")
     print("BUILD 文件更新完成！")
+    sys.stdout.flush()
 
 if __name__ == "__main__":
     main()